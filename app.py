@@ -2,9 +2,9 @@
 import streamlit as st
 import supabase_client as sc
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go  # Importação necessária para o gráfico combinado
-from datetime import datetime
+from datetime import datetime, date
 import time
 
 # --- Configuração da Página e CSS ---
@@ -14,23 +14,46 @@ st.set_page_config(
     layout="wide"
 )
 
+# Lê o CSS do disco uma única vez; os reruns reaproveitam o conteúdo em cache
+@st.cache_data
+def read_css(file_name):
+    with open(file_name) as f:
+        return f.read()
+
 # Função para carregar nosso CSS customizado
 def load_css(file_name):
     try:
-        with open(file_name) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        # O st.markdown precisa rodar a cada rerun para o estilo continuar na página
+        st.markdown(f"<style>{read_css(file_name)}</style>", unsafe_allow_html=True)
     except FileNotFoundError:
         st.error(f"Arquivo CSS '{file_name}' não encontrado. Certifique-se que ele está na mesma pasta que app.py")
 
 load_css("style.css")
 
 # --- Categorias (Atualizadas) ---
-CATEGORIAS_DESPESA = ['Moradia', 'Alimentação', 'Transporte', 'Lazer', 'Saúde', 'Outros', 'Impostos', 'Cartão de Crédito', 'Empréstimo','Despesas fixas']
+CATEGORIAS_DESPESA = ('Moradia', 'Alimentação', 'Transporte', 'Lazer', 'Saúde', 'Outros', 'Impostos', 'Cartão de Crédito', 'Empréstimo','Despesas fixas')
 #colocar um jeito de por compras no cartao em quantas parcelas e o dia fixo de pagamento do cartao de credito e emprestimo. 
 #por opcao de compra no cartao de credito e emprestimo.
 #por opção de deletar objetos na tabela de transacoes.
-CATEGORIAS_RECEITA = ['Salário', 'Freelance', 'Outros', 'Investimentos', 'Vendas']
-CATEGORIAS_INVESTIMENTO = ['Ações', 'Fundos Imobiliários', 'Renda Fixa', 'Cripto', 'Outros']
+CATEGORIAS_RECEITA = ('Salário', 'Freelance', 'Outros', 'Investimentos', 'Vendas')
+CATEGORIAS_INVESTIMENTO = ('Ações', 'Fundos Imobiliários', 'Renda Fixa', 'Cripto', 'Outros')
+
+# Categorias por tipo (usado no formulário de adição)
+CATS_BY_TIPO = {
+    'despesa': CATEGORIAS_DESPESA,
+    'receita': CATEGORIAS_RECEITA,
+    'investimento': CATEGORIAS_INVESTIMENTO,
+}
+
+# 'tipo' como categoria: groupby/filtros usam códigos inteiros em vez de strings
+TIPO_DTYPE = pd.CategoricalDtype(['receita', 'despesa', 'investimento'])
+
+TIPO_CODES = {tipo: code for code, tipo in enumerate(TIPO_DTYPE.categories)}
+
+# Colunas do histórico agregado (as do mês são sc.TX_COLS, a mesma projeção da consulta)
+HIST_COLUNAS = ['data', 'tipo', 'categoria', 'valor']
+# Colunas exibidas na tabela de histórico do mês
+TABELA_COLUNAS = ('data', 'descricao', 'categoria', 'tipo', 'valor')
 
 # --- MUDANÇA: Mapeamento de Meses para Português ---
 MESES_PORTUGUES = {
@@ -46,16 +69,189 @@ if 'user' not in st.session_state:
     st.session_state['user'] = None
 
 # --- Funções de Carregamento de Dados ---
-@st.cache_data(ttl=300) # Cache por 5 minutos
-def load_data(user_id):
-    """Carrega transações e converte tipos."""
-    transactions = sc.get_transactions(user_id)
-    if transactions:
-        df = pd.DataFrame(transactions)
-        df['valor'] = pd.to_numeric(df['valor'])
-        df['data'] = pd.to_datetime(df['data'])
-        return df
-    return pd.DataFrame(columns=['id', 'tipo', 'valor', 'descricao', 'categoria', 'data'])
+CACHE_TTL = 300 # 5 minutos
+
+def month_bounds(ano, mes):
+    """Retorna o intervalo [início, início do mês seguinte) de um mês."""
+    start = date(ano, mes, 1)
+    end = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return start, end
+
+def build_frame(rows, columns):
+    """Monta o DataFrame coluna a coluna (column-major) e ajusta os tipos."""
+    df = pd.DataFrame({col: [row[col] for row in rows] for col in columns})
+    # Tipo desconhecido vira NaN explicitamente (o pandas deixará de aceitar isso no astype)
+    df['tipo'] = df['tipo'].where(df['tipo'].isin(TIPO_DTYPE.categories))
+    df = df.astype({'tipo': TIPO_DTYPE, 'categoria': 'category', 'valor': 'float64'})
+    df['data'] = pd.to_datetime(df['data'])
+    return df
+
+def totais_por_tipo(codes, valores):
+    """
+    Soma 'valor' por tipo numa única passada (np.bincount sobre os códigos).
+    Retorna os totais na ordem de TIPO_DTYPE: receita, despesa, investimento.
+    Tipos fora de TIPO_DTYPE (código -1) são ignorados.
+    """
+    validos = codes >= 0
+    return np.bincount(codes[validos], weights=valores.to_numpy()[validos], minlength=len(TIPO_CODES))
+
+@st.cache_data(ttl=CACHE_TTL) # Cache por 5 minutos
+def load_data(user_id, ano, mes):
+    """Carrega as transações de um mês (filtro feito no Supabase) e converte tipos."""
+    start, end = month_bounds(ano, mes)
+    transactions = sc.get_transactions_range(user_id, start, end)
+    return build_frame(transactions, sc.TX_COLS) # Lista vazia gera frame vazio já tipado
+
+@st.cache_resource
+def data_versions():
+    """
+    Versão dos dados de cada usuário ({user_id: int}), compartilhada por todas
+    as sessões do processo: uma transação adicionada em outra aba ou aparelho
+    também invalida o histórico desta sessão.
+    """
+    return {}
+
+def history_version(user_id):
+    """
+    Chave do snapshot do histórico: versão dos dados do usuário + janela do TTL.
+    Calculada uma vez por rerun e passada a todos que leem o histórico, para
+    que KPIs, filtros e gráficos venham da mesma entrada de load_history.
+    """
+    return (data_versions().get(user_id, 0), int(time.time() // CACHE_TTL))
+
+@st.cache_data(ttl=CACHE_TTL) # Cache por 5 minutos
+def load_history(user_id, versao):
+    """
+    Carrega o histórico agregado por dia/tipo/categoria (sem linhas individuais).
+    'versao' (ver history_version) só entra na chave do cache: uma nova janela
+    do TTL ou uma nova transação força uma busca nova.
+    Retorna (df, anos em ordem decrescente, {ano: meses com transações},
+    totais por tipo, {(ano, mes): totais por tipo do mês}).
+    """
+    df = build_frame(sc.get_daily_totals(user_id), HIST_COLUNAS)
+    # Ano/mês calculados uma vez por carga do cache, não a cada rerun
+    df['ano'] = df['data'].dt.year.astype('int16')
+    df['mes'] = df['data'].dt.month.astype('int8')
+    # Já vem ordenado por data do RPC (ORDER BY data), sem reordenar aqui
+
+    if df.empty: # Primeiro acesso: KPIs zerados sem passar pelos groupbys
+        return df, [], {}, np.zeros(len(TIPO_CODES)), {}
+
+    anos = np.unique(df['ano'].to_numpy())[::-1]
+    meses_por_ano = {
+        int(ano): np.unique(df['mes'].to_numpy()[df['ano'].to_numpy() == ano]).tolist()
+        for ano in anos
+    }
+
+    # KPIs pré-calculados: trocar o mês no filtro vira uma busca no dict
+    kpi_total = totais_por_tipo(df['tipo'].cat.codes.to_numpy(), df['valor'])
+    kpi_mensal = df.groupby(['ano', 'mes', 'tipo'], observed=True, sort=False)['valor'].sum() \
+                   .unstack('tipo', fill_value=0.0) \
+                   .reindex(columns=TIPO_DTYPE.categories, fill_value=0.0)
+    kpi_por_mes = {
+        (int(ano), int(mes)): valores
+        for (ano, mes), valores in zip(kpi_mensal.index, kpi_mensal.to_numpy())
+    }
+    return df, anos.tolist(), meses_por_ano, kpi_total, kpi_por_mes
+
+def get_history(user_id, versao):
+    """
+    Devolve o histórico guardado na sessão. Só consulta load_history (e paga a
+    cópia do cache) quando o usuário ou a versão (ver history_version) muda.
+    """
+    if st.session_state.get('history_version') != (user_id, versao):
+        st.session_state['history'] = load_history(user_id, versao)
+        st.session_state['history_version'] = (user_id, versao)
+    return st.session_state['history']
+
+# --- Funções de Gráficos ---
+TIMELINE_WEBGL_MIN_PONTOS = 500 # A partir daqui a linha usa Scattergl
+
+def make_pie(agg, uirevision):
+    """
+    Monta o gráfico de rosca a partir de uma Series já agregada (categoria -> valor).
+    Layout compartilhado pelos dois gráficos de pizza, passado direto no construtor.
+    """
+    return go.Figure(
+        data=go.Pie(labels=agg.index.astype(str), values=agg.to_numpy(), hole=.3),
+        layout=dict(
+            height=150, # Define a altura fixa
+            legend_title_text='Categorias',
+            margin=dict(t=0, b=0, l=0, r=0),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='#FAFAFA',
+            uirevision=uirevision, # Mantém o estado da legenda entre reruns
+            transition_duration=0 # Sem animação na primeira pintura
+        )
+    )
+
+def make_timeline(df_timeline):
+    """
+    Monta o gráfico combinado (3 barras + linha de saldo acumulado) de uma vez,
+    com todos os traces e o layout no construtor (uma única validação).
+    """
+    x = df_timeline.index.to_numpy() # Datas
+    # Séries longas: a linha de saldo é desenhada via WebGL em vez de SVG
+    linha = go.Scattergl if len(df_timeline) > TIMELINE_WEBGL_MIN_PONTOS else go.Scatter
+    return go.Figure(
+        data=[
+            go.Bar(x=x, y=df_timeline['receita'].to_numpy(),
+                   name='Receita (Dia)', marker_color='#10b981'),
+            go.Bar(x=x, y=df_timeline['despesa'].to_numpy(),
+                   name='Despesa (Dia)', marker_color='#ef4444'),
+            go.Bar(x=x, y=df_timeline['investimento'].to_numpy(),
+                   name='Investimento (Dia)', marker_color='#FFC300'), # Amarelo/Ouro
+            linha(x=x, y=df_timeline['saldo_acumulado_total'].to_numpy(),
+                  name='Saldo Acumulado (Vitalício)',
+                  mode='lines+markers',
+                  line=dict(color='#667eea', width=3)),
+        ],
+        layout=dict(
+            barmode='group', # Agrupa as barras
+            title="Fluxo de Caixa vs. Saldo Acumulado (Toda a História)",
+            xaxis_title="Data",
+            yaxis_title="Valor (R$)",
+            legend_title="Métricas",
+            plot_bgcolor='#0E1117', # Fundo do gráfico
+            paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel (transparente)
+            font_color='#FAFAFA', # Cor da fonte para tema escuro
+            uirevision='timeline' # Mantém zoom/legenda entre reruns
+        )
+    )
+
+@st.cache_data(ttl=CACHE_TTL) # Cache por 5 minutos
+def build_timeline_fig(user_id, versao):
+    """Monta a figura de tendência a partir do histórico (em cache por usuário/versão)."""
+    df = load_history(user_id, versao)[0]
+
+    # 1. Agrupa por DATA (dia); o reindex garante as 3 colunas de tipo
+    df_timeline = df.groupby(['data', 'tipo'], observed=True)['valor'].sum() \
+                    .unstack('tipo', fill_value=0.0) \
+                    .reindex(columns=TIPO_DTYPE.categories, fill_value=0.0)
+
+    # 2. Calcula o saldo DIÁRIO
+    df_timeline['saldo_diario'] = df_timeline['receita'] - df_timeline['despesa']
+
+    # 3. Calcula o Saldo ACUMULADO VITALÍCIO
+    df_timeline['saldo_acumulado_total'] = df_timeline['saldo_diario'].cumsum()
+
+    # 4. O Eixo X é o próprio index (as datas)
+    return make_timeline(df_timeline)
+
+@st.cache_data(ttl=CACHE_TTL) # Cache por 5 minutos
+def build_pie_fig(user_id, tipo, ano=None, mes=None, versao=None):
+    """
+    Monta a pizza por categoria de um tipo: do mês (ano/mes) ou, sem eles, do
+    histórico total na 'versao' dada. Retorna None se não houver transações desse tipo.
+    """
+    df = load_history(user_id, versao)[0] if ano is None else load_data(user_id, ano, mes)
+    df_tipo = df[df['tipo'].cat.codes.to_numpy() == TIPO_CODES[tipo]]
+    if df_tipo.empty:
+        return None
+    # Agrega no pandas e envia só ~1 linha por categoria ao Plotly
+    agg = df_tipo.groupby('categoria', observed=True, sort=False)['valor'].sum()
+    return make_pie(agg, tipo)
 
 # =========================================================================
 # === PÁGINA 1: TELA DE LOGIN (Sem mudanças) ===============================
@@ -76,8 +272,7 @@ def show_login_page():
                 response = sc.sign_in(email_login, password_login)
                 if hasattr(response, 'user') and response.user:
                     st.session_state['user'] = response.user.model_dump()
-                    st.success("Login realizado com sucesso!")
-                    time.sleep(1) # Pequena pausa para o usuário ler a msg
+                    st.toast("Login realizado com sucesso!", icon="✅") # Não bloqueia o worker
                     st.rerun()
                 else:
                     st.error(f"Erro no login: {response.get('error', 'Credenciais inválidas.')}")
@@ -109,15 +304,19 @@ def show_main_app():
         response = sc.sign_out()
         if "error" not in response:
             st.session_state['user'] = None
-            st.success("Logout realizado com sucesso!")
-            time.sleep(1)
+            # Descarta o histórico guardado na sessão do usuário que saiu
+            st.session_state.pop('history', None)
+            st.session_state.pop('history_version', None)
+            st.toast("Logout realizado com sucesso!", icon="✅")
             st.rerun()
         else:
             st.error(f"Erro no logout: {response['error']}")
 
     # --- Carregar Dados ---
     user_id = st.session_state['user']['id']
-    df = load_data(user_id) # Este é o DataFrame TOTAL
+    # Histórico TOTAL (agregado por dia/tipo/categoria) e KPIs pré-calculados
+    versao = history_version(user_id) # Mesmo snapshot para KPIs, filtros e gráficos
+    df, anos_disponiveis, meses_por_ano, kpi_total, kpi_por_mes = get_history(user_id, versao)
 
     # --- 1. HEADER E FILTROS ---
     with st.container(): # Container estilizado pelo CSS
@@ -133,33 +332,29 @@ def show_main_app():
             mes_selecionado = mes_atual
         else:
             # Filtros de Mês e Ano (como no seu HTML)
-            df['ano'] = df['data'].dt.year
-            df['mes'] = df['data'].dt.month
-            
-            # --- MUDANÇA: Ordena por DATA (não por ano/mes) ---
-            df = df.sort_values(by='data')
-            
-            anos_disponiveis = sorted(df['ano'].unique(), reverse=True)
-            meses_disponiveis = sorted(df['mes'].unique())
-            
+            # Anos/meses disponíveis já vêm calculados de load_history
             ano_atual = datetime.now().year if datetime.now().year in anos_disponiveis else anos_disponiveis[0]
-            mes_atual = datetime.now().month if datetime.now().month in meses_disponiveis else meses_disponiveis[0]
 
             col_filtro1, col_filtro2 = st.columns(2)
             ano_selecionado = col_filtro1.selectbox("Ano", anos_disponiveis, index=anos_disponiveis.index(ano_atual))
+
+            # Só mostra os meses que têm transações no ano selecionado
+            meses_disponiveis = meses_por_ano[ano_selecionado]
+            mes_atual = datetime.now().month if datetime.now().month in meses_disponiveis else meses_disponiveis[0]
             
             # --- MUDANÇA (Tradução) ---
             mes_selecionado = col_filtro2.selectbox("Mês", meses_disponiveis, index=meses_disponiveis.index(mes_atual), 
-                                                     format_func=lambda x: MESES_PORTUGUES.get(x, x))
+                                                     format_func=MESES_PORTUGUES.get)
 
-            # Filtrar DataFrame para os KPIs MENSAIS e gráficos
-            df_filtered = df[(df['ano'] == ano_selecionado) & (df['mes'] == mes_selecionado)]
+            # Busca só as transações do mês para os KPIs MENSAIS, gráficos e histórico
+            df_filtered = load_data(user_id, ano_selecionado, mes_selecionado)
+
+    # Nome do mês resolvido uma vez por rerun e reutilizado nos títulos
+    nome_mes = MESES_PORTUGUES[mes_selecionado]
 
     # --- 2. KPIs TOTAIS (Sem filtro de mês) ---
     st.subheader("Visão Geral (Total)")
-    receitas_total = df[df['tipo'] == 'receita']['valor'].sum()
-    despesas_total = df[df['tipo'] == 'despesa']['valor'].sum()
-    investimentos_total = df[df['tipo'] == 'investimento']['valor'].sum()
+    receitas_total, despesas_total, investimentos_total = kpi_total
     saldo_total = receitas_total - despesas_total
 
     col1, col2, col3, col4 = st.columns(4)
@@ -170,10 +365,8 @@ def show_main_app():
 
     # --- 3. KPIs MENSAIS (Com filtro de mês) ---
     # --- MUDANÇA (Tradução) ---
-    st.subheader(f"Resumo de {MESES_PORTUGUES.get(mes_selecionado, mes_selecionado)}/{ano_selecionado}")
-    receitas_mes = df_filtered[df_filtered['tipo'] == 'receita']['valor'].sum()
-    despesas_mes = df_filtered[df_filtered['tipo'] == 'despesa']['valor'].sum()
-    investimentos_mes = df_filtered[df_filtered['tipo'] == 'investimento']['valor'].sum()
+    st.subheader(f"Resumo de {nome_mes}/{ano_selecionado}")
+    receitas_mes, despesas_mes, investimentos_mes = kpi_por_mes.get((ano_selecionado, mes_selecionado), (0.0, 0.0, 0.0))
     saldo_mes = receitas_mes - despesas_mes
 
     col5, col6, col7, col8 = st.columns(4)
@@ -195,100 +388,17 @@ def show_main_app():
             if df.empty:
                 st.info(f"Sem dados de transação para mostrar a tendência.")
             else:
-                # 1. Agrupa por DATA (dia)
-                df_timeline = df.pivot_table(
-                    index='data', # <<< MUDANÇA: Agrupa por 'data'
-                    columns='tipo',
-                    values='valor',
-                    aggfunc='sum'
-                ).fillna(0)
-                
-                # Garante que todas as colunas de tipo existem
-                for col in ['receita', 'despesa', 'investimento']:
-                    if col not in df_timeline:
-                        df_timeline[col] = 0
-                        
-                # 2. Calcula o saldo DIÁRIO
-                df_timeline['saldo_diario'] = df_timeline['receita'] - df_timeline['despesa']
-                
-                # 3. Calcula o Saldo ACUMULADO VITALÍCIO
-                df_timeline['saldo_acumulado_total'] = df_timeline['saldo_diario'].cumsum()
-                
-                # 4. O Eixo X agora é o próprio index (as datas)
-                # Não precisamos criar 'labels_x'
-                
-                # --- 5. Cria o Gráfico Combinado ---
-                fig_timeline = go.Figure()
-
-                # --- 3 BARRAS + 1 LINHA ---
-                # Barra de Receita
-                fig_timeline.add_trace(go.Bar(
-                    x=df_timeline.index, # <<< MUDANÇA: Usa o index (datas)
-                    y=df_timeline['receita'],
-                    name='Receita (Dia)',
-                    marker_color='#10b981'
-                ))
-                
-                # Barra de Despesa
-                fig_timeline.add_trace(go.Bar(
-                    x=df_timeline.index, # <<< MUDANÇA: Usa o index (datas)
-                    y=df_timeline['despesa'],
-                    name='Despesa (Dia)',
-                    marker_color='#ef4444'
-                ))
-                
-                # Barra de Investimento
-                fig_timeline.add_trace(go.Bar(
-                    x=df_timeline.index, # <<< MUDANÇA: Usa o index (datas)
-                    y=df_timeline['investimento'],
-                    name='Investimento (Dia)',
-                    marker_color='#FFC300' # Amarelo/Ouro
-                ))
-                
-                # Linha de Saldo ACUMULADO TOTAL
-                fig_timeline.add_trace(go.Scatter(
-                    x=df_timeline.index, # <<< MUDANÇA: Usa o index (datas)
-                    y=df_timeline['saldo_acumulado_total'], 
-                    name='Saldo Acumulado (Vitalício)',
-                    mode='lines+markers',
-                    line=dict(color='#667eea', width=3)
-                ))
-
-                # Configura o layout
-                fig_timeline.update_layout(
-                    barmode='group',  # Agrupa as barras
-                    title=f"Fluxo de Caixa vs. Saldo Acumulado (Toda a História)",
-                    xaxis_title="Data", # <<< MUDANÇA
-                    yaxis_title="Valor (R$)",
-                    legend_title="Métricas",
-                    plot_bgcolor='#0E1117', # Fundo do gráfico
-                    paper_bgcolor='rgba(0,0,0,0)', # Fundo do papel (transparente)
-                    font_color='#FAFAFA' # Cor da fonte para tema escuro
-                )
-                
-                st.plotly_chart(fig_timeline, use_container_width=True)
+                # Figura em cache: reruns que não mudam os dados não remontam o gráfico
+                st.plotly_chart(build_timeline_fig(user_id, versao), use_container_width=True)
 
     with col_charts_right:
         # --- Gráfico de Despesas (Filtrado por Mês) ---
         with st.container(border=True):
             # --- MUDANÇA (Tradução) ---
-            st.subheader(f"🏷️ Despesas de {MESES_PORTUGUES.get(mes_selecionado, mes_selecionado)}")
-            df_despesas = df_filtered[df_filtered['tipo'] == 'despesa'] # Usa df_filtered
-            if not df_despesas.empty:
-                fig_pie = px.pie(df_despesas, 
-                                 names='categoria', 
-                                 values='valor', 
-                                 hole=.3) # Gráfico de rosca
-                
-                # --- Adicionado height=150 (como no seu código) ---
-                fig_pie.update_layout(
-                    height=150, # Define a altura fixa
-                    legend_title_text='Categorias', 
-                    margin=dict(t=0, b=0, l=0, r=0),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font_color='#FAFAFA'
-                )
+            st.subheader(f"🏷️ Despesas de {nome_mes}")
+            # Usa as transações do mês (figura em cache por usuário/ano/mês)
+            fig_pie = None if df.empty else build_pie_fig(user_id, 'despesa', ano_selecionado, mes_selecionado)
+            if fig_pie is not None:
                 st.plotly_chart(fig_pie, use_container_width=True)
             else:
                 st.info("Nenhuma despesa registrada no período.")
@@ -296,22 +406,9 @@ def show_main_app():
         # --- Gráfico de Investimentos (Geral / Total) ---
         with st.container(border=True):
             st.subheader(f"📈 Investimentos (Geral)")
-            df_investimentos = df[df['tipo'] == 'investimento'] # Usa df (total)
-            if not df_investimentos.empty:
-                fig_pie_inv = px.pie(df_investimentos, 
-                                 names='categoria', 
-                                 values='valor', 
-                                 hole=.3)
-                
-                # --- Adicionado height=150 (como no seu código) ---
-                fig_pie_inv.update_layout(
-                    height=150, # Define a altura fixa
-                    legend_title_text='Categorias', 
-                    margin=dict(t=0, b=0, l=0, r=0),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font_color='#FAFAFA'
-                )
+            # Usa o histórico total (figura em cache por usuário)
+            fig_pie_inv = None if df.empty else build_pie_fig(user_id, 'investimento', versao=versao)
+            if fig_pie_inv is not None:
                 st.plotly_chart(fig_pie_inv, use_container_width=True)
             else:
                 st.info("Nenhum investimento registrado (Geral).")
@@ -325,20 +422,15 @@ def show_main_app():
     with st.expander("📝 Adicionar Nova Transação", expanded=df.empty): # 'expanded' é True só se for a primeira vez
         
         # Seletor de TIPO movido para FORA do form para atualização dinâmica
-        tipo = st.selectbox("Tipo", ["despesa", "receita", "investimento"], key="add_tipo_selector")
+        tipo = st.selectbox("Tipo", tuple(CATS_BY_TIPO), key="add_tipo_selector")
         
         with st.form("add_form", clear_on_submit=True):
             col_form1, col_form2 = st.columns(2)
             with col_form1:
                 valor = st.number_input("Valor (R$)", min_value=0.01, format="%.2f", key="add_valor")
                 
-                # Lógica condicional para Categoria
-                if tipo == 'despesa':
-                    categoria = st.selectbox("Categoria", CATEGORIAS_DESPESA, key="add_cat_des")
-                elif tipo == 'receita':
-                    categoria = st.selectbox("Categoria", CATEGORIAS_RECEITA, key="add_cat_rec")
-                elif tipo == 'investimento':
-                    categoria = st.selectbox("Categoria", CATEGORIAS_INVESTIMENTO, key="add_cat_inv")
+                # Categoria depende do tipo escolhido (uma key por tipo)
+                categoria = st.selectbox("Categoria", CATS_BY_TIPO[tipo], key=f"add_cat_{tipo}")
             
             with col_form2:
                 data = st.date_input("Data", datetime.today(), key="add_data")
@@ -351,19 +443,25 @@ def show_main_app():
                 response = sc.add_transaction(user_id, tipo, valor, descricao, categoria, data)
                 if response:
                     st.success("Transação adicionada!")
-                    st.cache_data.clear() # Limpa o cache para recarregar os dados
+                    # Invalida só as entradas deste usuário e do mês da transação
+                    load_data.clear(user_id, data.year, data.month)
+                    build_pie_fig.clear(user_id, 'despesa', data.year, data.month)
+                    # Nova versão: histórico, tendência e pizza geral mudam de chave em todas as sessões
+                    versoes = data_versions()
+                    versoes[user_id] = versoes.get(user_id, 0) + 1
                     st.rerun()
                 else:
                     st.error("Falha ao adicionar transação.")
 
     # --- Histórico de Transações (Obedece o filtro de mês) ---
     # --- MUDANÇA (Tradução) ---
-    with st.expander(f"📊 Histórico de Transações de {MESES_PORTUGUES.get(mes_selecionado, mes_selecionado)}"):
+    with st.expander(f"📊 Histórico de Transações de {nome_mes}"):
         if df_filtered.empty:
             st.info("Nenhuma transação para este mês.")
         else:
             st.dataframe(
-                df_filtered[['data', 'descricao', 'categoria', 'tipo', 'valor']],
+                df_filtered,
+                column_order=TABELA_COLUNAS, # Seleciona as colunas sem copiar o DataFrame
                 use_container_width=True,
                 hide_index=True
             )
@@ -1,7 +1,18 @@
 # supabase_client.py
+import random
+import time
+
+import httpx
 import streamlit as st
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
 
+# Colunas de 'transactions' lidas pelo app (sem user_id, que é o filtro, nem created_at)
+TX_COLS = ('id', 'tipo', 'valor', 'descricao', 'categoria', 'data')
+
+# Linhas por página do RPC 'daily_totals' (limite padrão de linhas por resposta do Supabase)
+DAILY_TOTALS_PAGE = 1000
+
 # Usa st.cache_resource para inicializar a conexão uma única vez.
 @st.cache_resource
 def init_connection() -> Client:
@@ -16,7 +27,45 @@ def init_connection() -> Client:
         st.error(f"Erro ao conectar com o Supabase: {e}")
         return None
 
-supabase_client = init_connection()
+def get_client() -> Client:
+    """
+    Retorna o cliente Supabase compartilhado.
+    Como init_connection usa st.cache_resource, a mesma instância (e o pool
+    HTTP dela) é reutilizada em todos os reruns do processo.
+    Se a conexão falhou, limpa o cache e tenta de novo uma vez; persistindo
+    a falha, levanta RuntimeError em vez de devolver None.
+    """
+    client = init_connection()
+    if client is None:
+        init_connection.clear() # Não guarda a falha em cache
+        client = init_connection()
+        if client is None:
+            raise RuntimeError("Supabase indisponível")
+    return client
+
+# Códigos de APIError tratados como transitórios: HTTP 429/503/504 (sem corpo
+# JSON o postgrest usa o status como código) e PostgREST sem acesso ao banco
+RETRY_API_CODES = {'429', '503', '504', 'PGRST000', 'PGRST001', 'PGRST002'}
+
+def _is_transient(e):
+    """Indica se a exceção é uma falha transitória que vale repetir."""
+    if isinstance(e, httpx.TransportError):
+        return True
+    return isinstance(e, APIError) and str(e.code) in RETRY_API_CODES
+
+def _retry(request, max_retries=3, base=0.2, max_delay=2.0):
+    """
+    Executa request() repetindo em falhas transitórias (rede, limite de taxa
+    e gateway indisponível, ver _is_transient), com backoff exponencial e
+    jitter. Usar só em operações idempotentes.
+    """
+    for tentativa in range(max_retries + 1):
+        try:
+            return request()
+        except (httpx.TransportError, APIError) as e:
+            if tentativa == max_retries or not _is_transient(e):
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base * 2 ** tentativa)))
 
 # --- Funções de Autenticação ---
 
@@ -25,7 +74,7 @@ def sign_up(email, password):
     Registra um novo usuário.
     """
     try:
-        res = supabase_client.auth.sign_up({
+        res = get_client().auth.sign_up({
             "email": email,
             "password": password,
         })
@@ -38,7 +87,7 @@ def sign_in(email, password):
     Autentica um usuário existente.
     """
     try:
-        res = supabase_client.auth.sign_in_with_password({
+        res = get_client().auth.sign_in_with_password({
             "email": email,
             "password": password,
         })
@@ -51,7 +100,7 @@ def sign_out():
     Desloga o usuário.
     """
     try:
-        res = supabase_client.auth.sign_out()
+        res = get_client().auth.sign_out()
         return res
     except Exception as e:
         return {"error": str(e)}
@@ -61,7 +110,7 @@ def get_user_session():
     Verifica se existe uma sessão de usuário ativa.
     """
     try:
-        session = supabase_client.auth.get_session()
+        session = get_client().auth.get_session()
         return session
     except Exception as e:
         return None
@@ -70,62 +119,210 @@ def get_user_session():
 
 def get_transactions(user_id):
     """
-    Busca todas as transações de um usuário específico.
+    Busca todas as transações de um usuário específico
+    (só as colunas usadas pelo app).
+    """
+    try:
+        query = get_client().table('transactions') \
+                            .select(', '.join(TX_COLS)) \
+                            .eq('user_id', user_id) \
+                            .order('data', desc=True)
+        response = _retry(query.execute)
+        return response.data
+    except Exception as e:
+        st.error(f"Erro ao buscar transações: {e}")
+        return []
+
+def get_transactions_range(user_id, start, end):
+    """
+    Busca as transações de um usuário com data no intervalo [start, end).
+    O filtro é aplicado no Supabase, trazendo só as linhas do período
+    e só as colunas usadas pelo app, em ordem crescente de data (ordem da
+    tabela de histórico do mês).
+    """
+    try:
+        query = get_client().table('transactions') \
+                            .select(', '.join(TX_COLS)) \
+                            .eq('user_id', user_id) \
+                            .gte('data', str(start)) \
+                            .lt('data', str(end)) \
+                            .order('data')
+        response = _retry(query.execute)
+        return response.data
+    except Exception as e:
+        st.error(f"Erro ao buscar transações: {e}")
+        return []
+
+def get_transactions_page(user_id, before=None, limit=50):
+    """
+    Busca uma página de transações, das mais recentes para as mais antigas.
+    'before' é o par (data, id) da última linha da página anterior
+    (paginação por chave, sem OFFSET); None busca a primeira página.
     """
     try:
-        response = supabase_client.table('transactions') \
-                                  .select('*') \
-                                  .eq('user_id', user_id) \
-                                  .order('data', desc=True) \
-                                  .execute()
+        query = get_client().table('transactions') \
+                            .select(', '.join(TX_COLS)) \
+                            .eq('user_id', user_id)
+        if before is not None:
+            data, tx_id = before
+            query = query.or_(f"data.lt.{data},and(data.eq.{data},id.lt.{tx_id})")
+        query = query.order('data', desc=True) \
+                     .order('id', desc=True) \
+                     .limit(limit)
+        response = _retry(query.execute)
         return response.data
     except Exception as e:
         st.error(f"Erro ao buscar transações: {e}")
         return []
 
+def get_daily_totals(user_id):
+    """
+    Busca a soma de 'valor' agrupada por data, tipo e categoria.
+    A agregação roda no Postgres via RPC 'daily_totals' (ver README), lida em
+    páginas de DAILY_TOTALS_PAGE linhas até vir uma página incompleta.
+    """
+    try:
+        rows = []
+        while True:
+            params = {'uid': user_id, 'lim': DAILY_TOTALS_PAGE, 'off': len(rows)}
+            page = _retry(get_client().rpc('daily_totals', params).execute).data
+            rows.extend(page)
+            if len(page) < DAILY_TOTALS_PAGE:
+                return rows
+    except Exception as e:
+        st.error(f"Erro ao buscar totais: {e}")
+        return []
+
 def add_transaction(user_id, tipo, valor, descricao, categoria, data):
     """
     Adiciona uma nova transação.
+    Usa returning='minimal' (o app não lê a linha criada) e retorna True
+    em caso de sucesso.
     """
     try:
-        response = supabase_client.table('transactions').insert({
+        get_client().table('transactions').insert({
             'user_id': user_id,
             'tipo': tipo,
             'valor': valor,
             'descricao': descricao,
             'categoria': categoria,
             'data': str(data) # Converte data para string no formato YYYY-MM-DD
-        }).execute()
-        return response.data
+        }, returning='minimal').execute()
+        return True
     except Exception as e:
         st.error(f"Erro ao adicionar transação: {e}")
         return None
 
+# Campos obrigatórios (NOT NULL) de cada linha passada a add_transactions_bulk
+TX_REQUIRED = ('tipo', 'valor', 'descricao', 'data')
+# Valores aceitos em 'tipo'
+TX_TIPOS = ('receita', 'despesa', 'investimento')
+
+def add_transactions_bulk(user_id, rows):
+    """
+    Adiciona várias transações num único INSERT (uma requisição para N linhas).
+    'rows' é uma lista de dicionários com tipo, valor, descricao, data e,
+    opcionalmente, categoria. As linhas são validadas antes do envio, pois
+    o PostgREST aborta o lote inteiro se uma delas falhar.
+    """
+    if not rows:
+        return True
+    for i, r in enumerate(rows):
+        faltando = [c for c in TX_REQUIRED if r.get(c) is None]
+        if faltando:
+            st.error(f"Erro ao adicionar transações: linha {i + 1} sem {', '.join(faltando)}")
+            return None
+        if r['tipo'] not in TX_TIPOS:
+            st.error(f"Erro ao adicionar transações: linha {i + 1} com tipo inválido '{r['tipo']}'")
+            return None
+    try:
+        get_client().table('transactions').insert([{
+            'user_id': user_id,
+            'tipo': r['tipo'],
+            'valor': r['valor'],
+            'descricao': r['descricao'],
+            'categoria': r.get('categoria'),
+            'data': str(r['data'])
+        } for r in rows], returning='minimal').execute()
+        return True
+    except Exception as e:
+        st.error(f"Erro ao adicionar transações: {e}")
+        return None
+
 def update_transaction(transaction_id, user_id, updates):
     """
     Atualiza uma transação existente.
     'updates' é um dicionário com os campos a atualizar.
+    Retorna True se alguma linha foi alterada, False se o id não existe
+    (ou não é do usuário) e None em caso de erro.
     """
     try:
-        response = supabase_client.table('transactions') \
-                                  .update(updates) \
-                                  .match({'id': transaction_id, 'user_id': user_id}) \
-                                  .execute()
-        return response.data
+        query = get_client().table('transactions') \
+                            .update(updates, count='exact', returning='minimal') \
+                            .match({'id': transaction_id, 'user_id': user_id})
+        response = _retry(query.execute)
+        return response.count > 0
     except Exception as e:
         st.error(f"Erro ao atualizar transação: {e}")
         return None
 
-def delete_transaction(transaction_id, user_id):
+def delete_transaction(transaction_id, user_id, want_row=False):
     """
     Deleta uma transação.
+    Retorna True se a linha foi removida, False se nenhuma linha bateu e
+    None em caso de erro. Se a resposta se perder e a requisição for
+    repetida, a linha já removida conta como False.
+    Com want_row=True a linha removida volta na mesma requisição
+    (DELETE ... RETURNING), dispensando um SELECT prévio, e o retorno é a
+    linha (ou None se nada foi removido). Esse caminho não é repetido:
+    uma nova tentativa não encontraria a linha já removida.
     """
     try:
-        response = supabase_client.table('transactions') \
-                                  .delete() \
-                                  .match({'id': transaction_id, 'user_id': user_id}) \
-                                  .execute()
-        return response.data
+        query = get_client().table('transactions') \
+                            .delete(count='exact', returning='representation' if want_row else 'minimal') \
+                            .match({'id': transaction_id, 'user_id': user_id})
+        if want_row:
+            response = query.execute()
+            return response.data[0] if response.data else None
+        response = _retry(query.execute)
+        return response.count > 0
     except Exception as e:
         st.error(f"Erro ao deletar transação: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def update_transactions(transaction_ids, user_id, updates):
+    """
+    Aplica o mesmo 'updates' a várias transações numa única requisição.
+    Retorna quantas linhas foram alteradas (None em caso de erro).
+    """
+    if not transaction_ids:
+        return 0
+    try:
+        query = get_client().table('transactions') \
+                            .update(updates, count='exact', returning='minimal') \
+                            .eq('user_id', user_id) \
+                            .in_('id', list(transaction_ids))
+        response = _retry(query.execute)
+        return response.count
+    except Exception as e:
+        st.error(f"Erro ao atualizar transações: {e}")
+        return None
+
+def delete_transactions(transaction_ids, user_id):
+    """
+    Deleta várias transações numa única requisição.
+    Retorna quantas linhas foram removidas (None em caso de erro); se a
+    requisição for repetida, as linhas já removidas não entram na contagem.
+    """
+    if not transaction_ids:
+        return 0
+    try:
+        query = get_client().table('transactions') \
+                            .delete(count='exact', returning='minimal') \
+                            .eq('user_id', user_id) \
+                            .in_('id', list(transaction_ids))
+        response = _retry(query.execute)
+        return response.count
+    except Exception as e:
+        st.error(f"Erro ao deletar transações: {e}")
+        return None